@@ -0,0 +1,18 @@
+"""Compiles the clue code kernel ahead of time so solve.py can skip the JIT compile.
+
+Run `python build_kernels.py` to produce the wordle_kernels_v<CLUE_CODES_VERSION> extension module
+next to solve.py, and run it again after changing the kernel. The ahead-of-time kernel runs
+serially; without a build for the current version solve.py falls back to the parallel JIT kernel.
+"""
+import pathlib
+
+from numba.pycc import CC
+
+from solve import AOT_KERNELS_MODULE, fill_clue_codes
+
+cc = CC(AOT_KERNELS_MODULE)
+cc.output_dir = str(pathlib.Path(__file__).parent)
+cc.export("fill_clue_codes", "void(u8[:], u8[:], u4[:], u2[:], u2[:], u2[:, :])")(fill_clue_codes)
+
+if __name__ == "__main__":
+    cc.compile()
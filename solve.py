@@ -1,43 +1,248 @@
-import enum
+import functools
+import hashlib
+import importlib
+import importlib.metadata
+import multiprocessing as mp
+import os
+import pathlib
+import tempfile
 import numpy as np
+from numba import njit, prange
 import matplotlib.pyplot as plt
+from multiprocessing import shared_memory
 import argparse
-from english_words import english_words_lower_set
 
 def lowercase_letters():
     return [chr(i) for i in range(97, 97 + 26)]
 
-def contains_only(word, allowable_characters):
-    for l in word:
-        if l not in allowable_characters:
-            return False
-    return True
+# Part of the key for saved candidate word lists. Bump it whenever the word filter changes.
+CANDIDATE_WORDS_VERSION = "1"
 
-def all_candidate_words(length=5):
-    letters = lowercase_letters()
-    return [w for w in english_words_lower_set if len(w) == length and contains_only(w, letters)]
 
-class TileStatus(enum.Enum):
-    Incorrect = enum.auto()
-    PartialMatch = enum.auto()
-    Correct = enum.auto()
+@functools.cache
+def all_candidate_words(length=5):
+    """Returns the dictionary words of the given length that only use lowercase letters.
+
+    The list is saved next to this file, keyed on the filter and dictionary versions, so later runs
+    skip loading and filtering the dictionary.
+    """
+    key = f"{CANDIDATE_WORDS_VERSION}\n{importlib.metadata.version('english_words')}\n{length}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    cache_file = pathlib.Path(__file__).parent / f"_words_{length}_{digest}.txt"
+    try:
+        return tuple(cache_file.read_text().split())
+    except (OSError, ValueError):
+        pass
+    from english_words import english_words_lower_set
+    letters = set(lowercase_letters())
+    words = tuple(sorted(w for w in english_words_lower_set if len(w) == length and letters.issuperset(w)))
+    save_cache_file(cache_file, lambda f: f.write("\n".join(words).encode()))
+    return words
+
+# Tile digits of a clue. A clue is a bytes object holding one digit per letter of the guess.
+INCORRECT, PARTIAL, CORRECT = 0, 1, 2
+
+
+NUM_CLUES = 3**5
+# Part of the key for saved clue code matrices. Bump it whenever the clue rules change.
+CLUE_CODES_VERSION = "2"
+
+
+def words_to_array(words):
+    return np.array([[ord(c) - 97 for c in w] for w in words], dtype=np.uint8).reshape(-1, 5)
+
+
+def letter_masks(words_arr):
+    """Returns a uint32 per word with bit k set iff letter k appears in the word."""
+    masks = np.zeros(words_arr.shape[0], dtype=np.uint32)
+    for k in range(words_arr.shape[1]):
+        masks |= np.left_shift(np.uint32(1), words_arr[:, k].astype(np.uint32))
+    return masks
+
+
+def pack_words(words_arr):
+    """Packs each word into a uint64 with the letter at position k in byte k."""
+    shifts = (8 * np.arange(words_arr.shape[1])).astype(np.uint64)
+    return np.bitwise_or.reduce(words_arr.astype(np.uint64) << shifts, axis=1)
+
+
+def _tile_code_lut(digit):
+    """Maps a 5-bit per-position mask to the clue code with `digit` in each set position."""
+    lut = np.zeros(32, dtype=np.uint16)
+    for m in range(32):
+        for k in range(5):
+            if (m >> k) & 1:
+                lut[m] += digit * 3**(4 - k)
+    return lut
+
+
+GREEN_CODES = _tile_code_lut(2)
+YELLOW_CODES = _tile_code_lut(1)
+LOW_7_BITS = np.uint64(0x7F7F7F7F7F)
+HIGH_BITS = np.uint64(0x8080808080)
+
+
+def fill_clue_codes(guesses, words, word_masks, green_codes, yellow_codes, out):
+    """Writes the clue code of every packed guess against every packed word into out.
+
+    This is compiled ahead of time by build_kernels.py when possible, and JIT compiled otherwise.
+    """
+    for gi in prange(guesses.shape[0]):
+        g = guesses[gi]
+        # Words are always five letters long, so the per-letter work is unrolled by hand to keep
+        # the guess letters in registers.
+        g0 = g & 0xFF
+        g1 = (g >> 8) & 0xFF
+        g2 = (g >> 16) & 0xFF
+        g3 = (g >> 24) & 0xFF
+        g4 = (g >> 32) & 0xFF
+        has_repeats = (g0 == g1 or g0 == g2 or g0 == g3 or g0 == g4 or g1 == g2 or g1 == g3 or g1 == g4
+                       or g2 == g3 or g2 == g4 or g3 == g4)
+        # Occurrences of each letter in the target that are not yet accounted for by a green tile.
+        remaining = np.zeros(26, dtype=np.uint8)
+        for wi in range(words.shape[0]):
+            w = words[wi]
+            # SWAR zero-byte detection: the high bit of byte k is set iff the letters match.
+            x = g ^ w
+            zero = ~(((x & LOW_7_BITS) + LOW_7_BITS) | x | LOW_7_BITS) & HIGH_BITS
+            z = zero >> 7
+            greens = (z | (z >> 7) | (z >> 14) | (z >> 21) | (z >> 28)) & 0x1F
+            wm = word_masks[wi]
+            yellows = ((wm >> g0) & 1) | (((wm >> g1) & 1) << 1) | (((wm >> g2) & 1) << 2) \
+                | (((wm >> g3) & 1) << 3) | (((wm >> g4) & 1) << 4)
+            yellows &= ~greens
+
+            # With a repeated letter in the guess, a letter is only marked as many times as it
+            # appears in the target: greens first, then yellows from left to right.
+            if has_repeats and yellows:
+                for k in range(5):
+                    if not (greens >> k) & 1:
+                        remaining[(w >> (8 * k)) & 0xFF] += 1
+                candidates = yellows
+                yellows = 0
+                for k in range(5):
+                    letter = (g >> (8 * k)) & 0xFF
+                    if (candidates >> k) & 1 and remaining[letter]:
+                        yellows |= 1 << k
+                        remaining[letter] -= 1
+                for k in range(5):
+                    remaining[(w >> (8 * k)) & 0xFF] = 0
+
+            out[gi, wi] = green_codes[greens] + yellow_codes[yellows]
+
+
+# The compiled extension is named after the clue rules it was built with, so a stale build is
+# ignored after CLUE_CODES_VERSION is bumped.
+AOT_KERNELS_MODULE = f"wordle_kernels_v{CLUE_CODES_VERSION}"
+
+try:
+    _fill_clue_codes = importlib.import_module(AOT_KERNELS_MODULE).fill_clue_codes
+except ImportError:
+    _fill_clue_codes = njit(parallel=True, cache=True, fastmath=True)(fill_clue_codes)
+
+
+def all_clue_codes(guesses_arr, words_arr, word_masks=None):
+    """Computes the clue code for every guess against every word.
+
+    Each tile is a ternary digit (0 = incorrect, 1 = partial match, 2 = correct), so a clue is
+    encoded as an integer in [0, 243). Returns an array of shape (num_guesses, num_words).
+    """
+    if word_masks is None:
+        word_masks = letter_masks(words_arr)
+    codes = np.empty((guesses_arr.shape[0], words_arr.shape[0]), dtype=np.uint16)
+    _fill_clue_codes(pack_words(guesses_arr), pack_words(words_arr), word_masks, GREEN_CODES, YELLOW_CODES,
+                     codes)
+    return codes
+
+
+def save_cache_file(path, write):
+    """Writes a cache file through write(file) and moves it into place in one step.
+
+    Readers never see a partially written file. If the cache cannot be written, e.g. because the
+    directory is read-only, it is silently skipped.
+    """
+    # Temporary files are created owner-only; give the cache the permissions a plain open would.
+    umask = os.umask(0)
+    os.umask(umask)
+    tmp_name = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name, suffix=".tmp", delete=False) as f:
+            tmp_name = f.name
+            write(f)
+        os.chmod(tmp_name, 0o666 & ~umask)
+        os.replace(tmp_name, path)
+    except OSError:
+        if tmp_name is not None and os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+
+@functools.cache
+def clue_code_matrix(words):
+    """Returns the clue code of every word guessed against every other word.
+
+    The matrix only depends on the dictionary, so it is saved next to this file and reloaded on
+    later runs.
+    """
+    digest = hashlib.sha1("\n".join((CLUE_CODES_VERSION, ) + words).encode()).hexdigest()[:16]
+    cache_file = pathlib.Path(__file__).parent / f"_clue_codes_{digest}.npy"
+    try:
+        return np.load(cache_file)
+    except (OSError, ValueError):
+        pass
+    words_arr = words_to_array(words)
+    codes = all_clue_codes(words_arr, words_arr)
+    save_cache_file(cache_file, lambda f: np.save(f, codes))
+    return codes
+
+
+def clue_counts(codes):
+    """Counts how many words produce each clue, for each row of a clue code matrix."""
+    num_guesses = codes.shape[0]
+    flat = codes + (np.arange(num_guesses) * NUM_CLUES)[:, None]
+    return np.bincount(flat.ravel(), minlength=num_guesses * NUM_CLUES).reshape(num_guesses, NUM_CLUES)
+
+
+def entropies_from_counts(counts):
+    """Computes the entropy of each clue count distribution along the last axis."""
+    p = counts / counts.sum(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return -np.where(p > 0, p * np.log(p), 0).sum(axis=-1)
+
+
+def clue_codes(guess, words):
+    """Returns the clue code of a guess against each word in a list, for the scalar entropy path."""
+    return np.fromiter((clue_code(word, guess) for word in words), dtype=np.uint16, count=len(words))
 
 
 def entropy(guess, words):
-    clue_probs = dict()
-    prob = 1.0 / len(words)
-    for word in words:
-        clue = get_clue(word, guess)
-        if clue in clue_probs:
-            clue_probs[clue] += prob
-        else:
-            clue_probs[clue] = prob
+    return entropies_from_counts(np.bincount(clue_codes(guess, words), minlength=NUM_CLUES))
+
 
-    entropy = 0
-    for p in clue_probs.values():
-        entropy -= p * np.log(p)
+def clue_digits(word, guess):
+    """Returns the tile digits of the clue for a guess, matching the encoding of all_clue_codes.
 
-    return entropy
+    A letter is only marked as many times as it appears in the solution: greens are assigned first,
+    then yellows from left to right.
+    """
+    digits = [CORRECT if w == g else INCORRECT for w, g in zip(word, guess)]
+    remaining = [0] * 26
+    for w, d in zip(word, digits):
+        if d == INCORRECT:
+            remaining[ord(w) - 97] += 1
+    for i, g in enumerate(guess):
+        k = ord(g) - 97
+        if digits[i] == INCORRECT and remaining[k]:
+            digits[i] = PARTIAL
+            remaining[k] -= 1
+    return digits
+
+
+def clue_code(word, guess):
+    """Returns the clue for a guess as a ternary integer, matching the encoding of all_clue_codes."""
+    code = 0
+    for d in clue_digits(word, guess):
+        code = code * 3 + d
+    return code
 
 
 def get_clue(word, guess):
@@ -45,116 +250,179 @@ def get_clue(word, guess):
         guess
     ), f"The guess ({guess}) is {len(guess)} letters, but the solution  ({word}) is {len(word)} letters long."
 
-    clue = []
-    for w, g in zip(word, guess):
-        status = TileStatus.Incorrect
-        if w == g:
-            status = TileStatus.Correct
-        elif g in word:
-            status = TileStatus.PartialMatch
-        clue.append((g, status))
+    return bytes(clue_digits(word, guess))
+
+
+class WordTable:
+    """The candidate words and the arrays derived from them, shared by every solver."""
+
+    def __init__(self, words, words_arr, word_masks, codes):
+        self.words = words
+        self.words_arr = words_arr
+        self.word_masks = word_masks
+        self.codes = codes
+
+    @classmethod
+    def build(cls, words):
+        words_arr = words_to_array(words)
+        return cls(words, words_arr, letter_masks(words_arr), clue_code_matrix(words))
+
+    def arrays(self):
+        return {"words_arr": self.words_arr, "word_masks": self.word_masks, "codes": self.codes}
+
+
+_word_table = None
+_attached_segments = []
+
+
+def word_table():
+    global _word_table
+    if _word_table is None:
+        _word_table = WordTable.build(all_candidate_words())
+    return _word_table
+
 
-    return tuple(clue)
+def share_word_table(table):
+    """Copies the arrays of a word table into shared memory.
+
+    Returns the shared memory segments, which the caller must unlink, and the specs that
+    attach_word_table needs to rebuild the table in another process.
+    """
+    segments = []
+    specs = {}
+    for key, arr in table.arrays().items():
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        segments.append(shm)
+        specs[key] = (shm.name, arr.shape, arr.dtype.str)
+    return segments, specs
+
+
+def attach_word_table(words, specs):
+    """Makes word_table() return views of arrays shared by another process."""
+    global _word_table
+    arrays = dict()
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _attached_segments.append(shm)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _word_table = WordTable(words, **arrays)
 
 
 class WordleState:
 
     def __init__(self):
-        self.letters = [set(lowercase_letters()) for _ in range(5)]
-        self.correct_letters = set()
+        # Bit k of pos_mask[i] is set iff letter k may still appear in position i.
+        self.pos_mask = np.full(5, (1 << 26) - 1, dtype=np.uint32)
+        # Bit k of required_mask is set iff letter k is known to appear in the solution.
+        self.required_mask = 0
 
     def __str__(self):
+        letters = lowercase_letters()
         string = "Positions:\n"
-        for i, l in enumerate(self.letters):
-            string += f"{i}: {sorted(list(l))}\n"
-        string += f"Correct letters: {self.correct_letters}"
+        for i, mask in enumerate(self.pos_mask):
+            string += f"{i}: {[l for k, l in enumerate(letters) if (mask >> k) & 1]}\n"
+        string += f"Correct letters: {set(l for k, l in enumerate(letters) if (self.required_mask >> k) & 1)}"
         return string
 
-    def add_clue(self, clue):
-        for i, c in enumerate(clue):
-            letter, status = c
-            if status == TileStatus.Incorrect:
-                assert letter not in self.correct_letters, f"Letter {l} was previously clued to be true."
-                for l in self.letters:
-                    l.discard(letter)
-            elif status == TileStatus.PartialMatch:
-                self.letters[i].discard(letter)
-                self.correct_letters.add(letter)
-            elif status == TileStatus.Correct:
-                assert letter in self.letters[
-                    i], f"Letter {l} was previously clued NOT to be in position {i}"
-                self.letters[i] = set([letter])
-                self.correct_letters.add(letter)
+    def add_clue(self, guess, clue):
+        # A gray tile only rules a letter out everywhere if no other tile in the clue marks it.
+        marked_letters = {letter for letter, status in zip(guess, clue) if status != INCORRECT}
+        for i, (letter, status) in enumerate(zip(guess, clue)):
+            k = ord(letter) - 97
+            bit = np.uint32(1 << k)
+            if status == INCORRECT:
+                if letter in marked_letters:
+                    self.pos_mask[i] &= ~bit
+                    continue
+                assert not (self.required_mask >> k) & 1, f"Letter {letter} was previously clued to be true."
+                self.pos_mask &= ~bit
+            elif status == PARTIAL:
+                self.pos_mask[i] &= ~bit
+                self.required_mask |= 1 << k
+            elif status == CORRECT:
+                assert self.pos_mask[i] & bit, f"Letter {letter} was previously clued NOT to be in position {i}"
+                self.pos_mask[i] = bit
+                self.required_mask |= 1 << k
             else:
-                assert ("Bad TileStatus")
-
-    def matches(self, word):
-        if len(word) != len(self.letters):
-            return False
-        for letter in self.correct_letters:
-            if letter not in word:
-                return False
-        for i, letter in enumerate(word):
-            if letter not in self.letters[i]:
-                return False
-        return True
-
-    def is_solved(self):
-        for l in self.letters:
-            if len(l) != 1:
-                return False
-        return True
+                assert False, f"Bad tile digit {status}"
 
-    def is_impossible(self):
-        for l in self.letters:
-            if len(l) == 0:
-                return True
-        return False
+    def matching_mask(self, words_arr, word_masks=None):
+        """Returns a boolean mask of the words in words_arr that are consistent with the clues."""
+        if word_masks is None:
+            word_masks = letter_masks(words_arr)
+        pos_ok = ((self.pos_mask[None, :] >> words_arr) & 1).all(axis=1)
+        required_mask = np.uint32(self.required_mask)
+        req_ok = (word_masks & required_mask) == required_mask
+        return pos_ok & req_ok
 
 
 class WordleSolver:
 
     def __init__(self, guess_all_words=False):
         self.guess_all_words = guess_all_words
-        self.total_word_set = all_candidate_words()
-        self.words = self.total_word_set.copy()
+        table = word_table()
+        self.total_word_set = table.words
+        self.words_arr = table.words_arr
+        self.word_masks = table.word_masks
+        self.codes = table.codes
+        self.alive = np.ones(len(self.total_word_set), dtype=bool)
         self.state = WordleState()
         self.update_words()
 
-    def add_clue(self, clue):
-        self.state.add_clue(clue)
+    @property
+    def alive_words(self):
+        return [self.total_word_set[i] for i in np.flatnonzero(self.alive)]
+
+    def add_clue(self, guess, clue):
+        self.state.add_clue(guess, clue)
 
     def next_guess(self):
-        highest_entropy = -np.inf
-        best_guess = ""
-        if len(self.words) == 1:
-            return next(iter(self.words))
-        guesses = self.total_word_set if self.guess_all_words else self.words
-        for guess in guesses:
-            word_entropy = entropy(guess, self.words)
-            if word_entropy > highest_entropy:
-                best_guess = guess
-                highest_entropy = word_entropy
-        return best_guess
+        alive_idx = np.flatnonzero(self.alive)
+        if len(alive_idx) == 0:
+            return ""
+        if len(alive_idx) <= 2:
+            return self.total_word_set[alive_idx[0]]
+        guess_idx = np.arange(len(self.total_word_set)) if self.guess_all_words else alive_idx
+        counts = clue_counts(self.codes[np.ix_(guess_idx, alive_idx)])
+        max_bucket = counts.max(axis=1)
+
+        # A guess that gives every live word a distinct clue has maximal entropy.
+        unique = guess_idx[max_bucket == 1]
+        if len(unique):
+            unique_alive = unique[self.alive[unique]]
+            return self.total_word_set[unique_alive[0] if len(unique_alive) else unique[0]]
+
+        # Entropy is bounded below by the min-entropy log(N / max_bucket) and above by the log of the
+        # number of distinct clues, so only guesses whose upper bound reaches the best lower bound
+        # need to be scored.
+        num_alive = len(alive_idx)
+        candidates = np.flatnonzero((counts > 0).sum(axis=1) * max_bucket.min() >= num_alive)
+
+        # Entropy is log(N) - sum(c * log(c)) / N over the clue counts c, so maximizing it is the
+        # same as minimizing the sum, which only needs a table of c * log(c) for c <= N.
+        n = np.arange(num_alive + 1)
+        c_log_c = np.zeros(num_alive + 1)
+        c_log_c[1:] = n[1:] * np.log2(n[1:])
+        best = candidates[c_log_c[counts[candidates]].sum(axis=1).argmin()]
+        return self.total_word_set[guess_idx[best]]
 
     def update_words(self):
-        self.words = set(filter(self.state.matches, self.words))
+        self.alive &= self.state.matching_mask(self.words_arr, self.word_masks)
 
     def is_impossible(self):
-        if len(self.words) == 0:
-            return True
-        return self.state.is_impossible()
+        return not self.alive.any()
 
     def is_solved(self):
-        return self.state.is_solved()
+        return np.count_nonzero(self.alive) == 1
 
 def solve_interactive():
 
-    tile_status_from_character = {
-        '-':TileStatus.Incorrect,
-        'y':TileStatus.PartialMatch,
-        'g':TileStatus.Correct
-    }
+    tile_characters = "-yg"
+    # Decodes a clue string to its tile digits, and deletes valid characters to find invalid ones.
+    tile_digit_table = bytes.maketrans(tile_characters.encode(), bytes((INCORRECT, PARTIAL, CORRECT)))
+    delete_valid_table = str.maketrans("", "", tile_characters)
+
     print("Input: '-' if the letter is not a match (gray)\n"
           "       'y' if the letter is not a partial match (yellow)\n"
           "       'g' if the letter is not a match (green)")
@@ -169,22 +437,18 @@ def solve_interactive():
                 continue
 
             # Check that the characters are valid
-            characters_are_valid = True
-            for c in clue_string:
-                if c not in tile_status_from_character.keys():
-                    print(f"Unknown tile status: {c}")
-                    characters_are_valid = False
-                    break
-            if not characters_are_valid:
+            invalid_characters = clue_string.translate(delete_valid_table)
+            if invalid_characters:
+                print(f"Unknown tile status: {invalid_characters[0]}")
                 continue
-                
-            return [(l, tile_status_from_character[c]) for l, c in zip(guess, clue_string)]
-    
+
+            return clue_string.encode().translate(tile_digit_table)
+
     solver = WordleSolver()
     guess = "slate"
     while True:
         clue = get_clue_from_user(guess)
-        solver.add_clue(clue)
+        solver.add_clue(guess, clue)
         solver.update_words() 
         
         if solver.is_solved():
@@ -197,7 +461,7 @@ def solve_interactive():
         guess = solver.next_guess()
 
 def solve(word, verbose=False, guess_all_words=False):
-    assert word in english_words_lower_set, f"The word '{word}' is not in my dictionary"
+    assert word in all_candidate_words(), f"The word '{word}' is not in my dictionary"
 
     solver = WordleSolver(guess_all_words=guess_all_words)
 
@@ -205,20 +469,41 @@ def solve(word, verbose=False, guess_all_words=False):
     iteration = 0
     while not solver.is_solved():
         iteration += 1
+        last_guess = guess
         clue = get_clue(word, guess)
-        solver.add_clue(clue)
+        solver.add_clue(guess, clue)
         solver.update_words()
 
         if verbose:
             print(f"Guess {iteration}: {guess}")
-            if len(solver.words) < 20:
-                print(solver.words)
+            num_words = np.count_nonzero(solver.alive)
+            if num_words < 20:
+                print(solver.alive_words)
             else:
-                print(f"{len(solver.words)} possible words")
+                print(f"{num_words} possible words")
         guess = solver.next_guess()
 
+    # The game ends once a single word is left, which still has to be guessed unless it just was.
+    if last_guess != word:
+        iteration += 1
+        if verbose:
+            print(f"Guess {iteration}: {guess}")
+
     return iteration
 
+def solve_all(guess_all_words=False):
+    """Solves every candidate word in parallel and returns the number of guesses each one took."""
+    table = word_table()
+    segments, specs = share_word_table(table)
+    try:
+        with mp.Pool(initializer=attach_word_table, initargs=(table.words, specs)) as pool:
+            iterations = pool.map(functools.partial(solve, guess_all_words=guess_all_words), table.words, chunksize=32)
+    finally:
+        for shm in segments:
+            shm.close()
+            shm.unlink()
+    return dict(zip(table.words, iterations))
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("mode", choices=["solve", "perf", "test"])
@@ -238,7 +523,6 @@ if __name__ == "__main__":
     elif args.mode == "solve":
         solve_interactive()
     elif args.mode == "perf":
-        iterations = dict()
-        iterations = {word: solve(word, guess_all_words=args.guess_all_words) for word in all_candidate_words()}
+        iterations = solve_all(guess_all_words=args.guess_all_words)
         plt.hist(iterations.values())
         plt.show()
\ No newline at end of file